@@ -2,23 +2,67 @@
 # pip requirement: numpy
 
 import argparse
+import hashlib
+import json
 import os
-from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
 from pathlib import Path
 
 import numpy as np
 
 n = 1_000_000
 max_n = 2**24 - 1
+txt_chunk_size = 2**16
+# any edit to this script invalidates previously generated outputs
+source_hash = hashlib.sha256(Path(__file__).read_bytes()).hexdigest()[:16]
 
 
+def _new_rng():
+    return np.random.default_rng(np.random.PCG64DXSM(0))
+
+
+rng = _new_rng()
+
+
+def _fmt_ints(arr):
+    return list(map(str, arr.tolist()))
+
+
+# Python floats have the same shortest repr as np.float64, but narrower floats
+# need numpy's str to stay shortest at their own precision
+def _fmt_floats(arr):
+    if arr.dtype == np.float64:
+        return list(map(str, arr.tolist()))
+    return [str(x) for x in arr]
+
+
+def _sha256_file(path):
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+# returns the digests of the written files, for the manifest
 def write_generic(strs, arr, full_name, base_dir):
     print(f"writing {full_name}...")
-    joined = "\n".join(strs)
-    with open(base_dir / "txt" / f"{full_name}.txt", "w") as f:
-        f.write(joined)
+    # write the text in chunks rather than joining it into one huge string
+    txt_path = base_dir / "txt" / f"{full_name}.txt"
+    with open(txt_path, "w") as f:
+        for i in range(0, len(strs), txt_chunk_size):
+            if i > 0:
+                f.write("\n")
+            f.write("\n".join(strs[i : i + txt_chunk_size]))
+    arr = np.ascontiguousarray(arr)
     with open(base_dir / "binary" / f"{full_name}.bin", "wb") as f:
-        f.write(arr.tobytes())
+        arr.tofile(f)
+    return {
+        "sha256": hashlib.sha256(arr).hexdigest(),
+        "txt_sha256": _sha256_file(txt_path),
+    }
+
+
+def get_full_name(dtype, name):
+    prefix = "micros" if dtype == "timestamp_micros" else dtype
+    return f"{prefix}_{name}"
 
 
 WRITERS = {}
@@ -33,68 +77,62 @@ def writer(f):
 
 
 def write_dispatch(dtype, arr, name, base_dir):
-    WRITERS[dtype](arr, name, base_dir)
+    return WRITERS[dtype](arr, name, base_dir)
 
 
 @writer
 def write_i32(arr, name, base_dir):
     if arr.dtype != np.int32:
         arr = np.floor(arr).astype(np.int32)
-    strs = [str(x) for x in arr]
-    full_name = f"i32_{name}"
-    write_generic(strs, arr, full_name, base_dir)
+    strs = _fmt_ints(arr)
+    return write_generic(strs, arr, get_full_name("i32", name), base_dir)
 
 
 @writer
 def write_u32(arr, name, base_dir):
     if arr.dtype != np.uint32:
         arr = np.floor(arr).astype(np.uint32)
-    strs = [str(x) for x in arr]
-    full_name = f"u32_{name}"
-    write_generic(strs, arr, full_name, base_dir)
+    strs = _fmt_ints(arr)
+    return write_generic(strs, arr, get_full_name("u32", name), base_dir)
 
 
 @writer
 def write_i64(arr, name, base_dir):
     if arr.dtype != np.int64:
         arr = np.floor(arr).astype(np.int64)
-    strs = [str(x) for x in arr]
-    full_name = f"i64_{name}"
-    write_generic(strs, arr, full_name, base_dir)
+    strs = _fmt_ints(arr)
+    return write_generic(strs, arr, get_full_name("i64", name), base_dir)
 
 
 @writer
 def write_f16(arr, name, base_dir):
     arr = arr.astype(np.float16)
-    strs = [str(x) for x in arr]
-    full_name = f"f16_{name}"
-    write_generic(strs, arr, full_name, base_dir)
+    strs = _fmt_floats(arr)
+    return write_generic(strs, arr, get_full_name("f16", name), base_dir)
 
 
 @writer
 def write_f32(arr, name, base_dir):
     arr = arr.astype(np.float32)
-    strs = [str(x) for x in arr]
-    full_name = f"f32_{name}"
-    write_generic(strs, arr, full_name, base_dir)
+    strs = _fmt_floats(arr)
+    return write_generic(strs, arr, get_full_name("f32", name), base_dir)
 
 
 @writer
 def write_f64(arr, name, base_dir):
     arr = arr.astype(np.float64)
-    strs = [str(x) for x in arr]
-    full_name = f"f64_{name}"
-    write_generic(strs, arr, full_name, base_dir)
+    strs = _fmt_floats(arr)
+    return write_generic(strs, arr, get_full_name("f64", name), base_dir)
 
 
 @writer
 def write_timestamp_micros(arr, name, base_dir):
     if arr.dtype != np.int64:
         arr = np.floor(arr).astype(np.int64)
-    ts = [datetime.utcfromtimestamp(x / 10**6) for x in arr]
-    strs = [x.strftime("%Y-%m-%dT%H:%M:%S:%fZ") for x in ts]
-    full_name = f"micros_{name}"
-    write_generic(strs, arr, full_name, base_dir)
+    strs = np.datetime_as_string(arr.view("datetime64[us]"), unit="us")
+    # keep the %Y-%m-%dT%H:%M:%S:%fZ layout
+    strs = np.char.add(np.char.replace(strs, ".", ":"), "Z")
+    return write_generic(strs, arr, get_full_name("timestamp_micros", name), base_dir)
 
 
 DATA_GENS = {}
@@ -111,12 +149,15 @@ def datagen(*dtypes):
 
 @datagen("i64")
 def geo():
-    return np.random.geometric(p=0.001, size=n)
+    return rng.geometric(p=0.001, size=n)
 
 
 def fixed_median_lomax(a, median):
     unscaled_median = 2 ** (1 / a) - 1
-    return np.random.pareto(a=a, size=n) / unscaled_median * median
+    res = rng.pareto(a=a, size=n)
+    res /= unscaled_median
+    res *= median
+    return res
 
 
 @datagen("i32", "u32", "i64")
@@ -126,23 +167,23 @@ def lomax05():
 
 @datagen("i64")
 def uniform():
-    return np.random.randint(-(2**63), 2**63, size=max_n)[:n]
+    return rng.integers(-(2**63), 2**63, size=max_n)[:n]
 
 
 # disable the following by default because it's kinda a waste of disk:
 # @datagen('i64')
 # def uniform_xl():
-#   return np.random.randint(-2**63, 2**63, size=max_n)
+#   return rng.integers(-2**63, 2**63, size=max_n)
 
 
 @datagen("i64")
 def constant():
-    return np.repeat(77777, n)
+    return np.full(n, 77777, dtype=np.int64)
 
 
 @datagen("i64")
 def sparse():
-    return np.random.binomial(1, p=0.01, size=n)
+    return rng.binomial(1, p=0.01, size=n)
 
 
 money = {}
@@ -152,16 +193,20 @@ def gen_money_once():
     if "dollars" in money:
         return
     dollars = np.floor(fixed_median_lomax(1.5, 5)).astype(np.int64)
-    cents = np.random.randint(0, 100, size=n)
-    p = np.random.uniform(size=n)
-    cents[p < 0.9] = 99
-    cents[p < 0.75] = 98
-    cents[p < 0.6] = 95
-    cents[p < 0.45] = 75
-    cents[p < 0.4] = 50
-    cents[p < 0.25] = 25
-    cents[p < 0.15] = 0
-    total_cents = dollars * 100 + cents
+    random_cents = rng.integers(0, 100, size=n)
+    p = rng.uniform(size=n)
+    # p falls into one of these buckets, each of which has a fixed cents
+    # value, except for the last (p >= 0.9) which keeps its random cents
+    thresholds = np.array([0.15, 0.25, 0.4, 0.45, 0.6, 0.75, 0.9])
+    bucket_cents = np.array([0, 25, 50, 75, 95, 98, 99])
+    bucket = np.searchsorted(thresholds, p, side="right")
+    cents = np.where(
+        bucket < len(bucket_cents),
+        bucket_cents[np.minimum(bucket, len(bucket_cents) - 1)],
+        random_cents,
+    )
+    total_cents = dollars * 100
+    total_cents += cents
 
     money["dollars"] = dollars
     money["cents"] = cents
@@ -189,75 +234,94 @@ def total_cents():
 @datagen("i64", "f64")
 def slow_cosine():
     periods = 103  # something prime
-    period = n / periods
-    return 100_000 * np.cos(np.arange(n) * 2 * np.pi / period)
+    res = np.linspace(0.0, 2 * np.pi * periods, n, endpoint=False)
+    np.cos(res, out=res)
+    res *= 100_000
+    return res
 
 
 # Including lower precisions mostly just to test performance bottlenecks
 @datagen("f64", "f32", "f16")
 def normal():
-    return np.random.normal(size=n)
+    return rng.standard_normal(n)
 
 
 @datagen("f32")
 def log_normal():
-    return np.exp(normal())
+    res = normal()
+    np.exp(res, out=res)
+    return res
 
 
 @datagen("f32")
 def csum():
-    return np.cumsum(log_normal() - np.exp(0.5))
+    res = log_normal()
+    res -= np.exp(0.5)
+    np.cumsum(res, out=res)
+    return res
 
 
 # timestamps increasing 1s at a time on average from 2022-01-01T00:00:00 with
 # 1s random jitter
 @datagen("timestamp_micros")
 def near_linear():
-    return 10**6 * (1640995200 + np.arange(n) + np.random.normal(size=n))
+    res = rng.standard_normal(n)
+    res += np.arange(1640995200, 1640995200 + n)
+    res *= 10**6
+    return res
 
 
 # millisecond timestamps compressed as microseconds
 @datagen("timestamp_micros")
 def millis():
-    return 10**3 * (1640995200000 + np.random.randint(0, 10**9, size=n))
+    res = rng.integers(0, 10**9, size=n)
+    res += 1640995200000
+    res *= 10**3
+    return res
 
 
 # integers compressed as floats
 @datagen("f64")
 def integers():
-    return np.random.randint(0, 2**30, size=n)
+    return rng.integers(0, 2**30, size=n)
 
 
 # `float32`s compressed as `float64`s
 @datagen("f64")
 def quantized_normal():
-    return np.random.normal(size=n).astype(np.float32).astype(np.float64)
+    return rng.standard_normal(n).astype(np.float32).astype(np.float64)
 
 
 # decimal floats
 @datagen("f64")
 def decimal():
-    return np.random.randint(1000, 10000, size=n) / 100
+    return rng.integers(1000, 10000, size=n) / 100
 
 
 @datagen("f64")
 def radians():
-    return (np.arange(n) + 10) * np.pi
+    res = np.arange(10, n + 10, dtype=np.float64)
+    res *= np.pi
+    return res
 
 
 # 10 interleaved 0th order sequences with different scales
 @datagen("i64")
 def interl0():
     bases = 10 ** np.arange(10)
-    interleaved = bases[None, :] + np.random.normal(scale=22, size=[n // 10, 10])
+    interleaved = rng.normal(scale=22, size=[n // 10, 10])
+    interleaved += bases[None, :]
     return interleaved.reshape(-1)
 
 
 # 10 interleaved 1st order sequences with different scales
 def interl1_helper():
-    deltas = np.random.randint(-10, 10, size=[n // 10, 10])
+    # the walks stay well within i32 range, so accumulate them in i32 and only
+    # widen when adding the i64 bases
+    deltas = rng.integers(-10, 10, size=[n // 10, 10], dtype=np.int32)
+    np.cumsum(deltas, axis=0, out=deltas)
     bases = 10 ** np.arange(10)
-    return bases[None, :] + np.cumsum(deltas, axis=0)
+    return bases[None, :] + deltas
 
 
 @datagen("i64")
@@ -270,16 +334,19 @@ def interl1():
 @datagen("i64")
 def interl_scrambl1():
     interleaved = interl1_helper()
-    idxs = np.random.rand(*interleaved.shape).argsort(axis=1)
-    interleaved_scrambled = np.take_along_axis(interleaved, idxs, axis=1)
-    return interleaved_scrambled.reshape(-1)
+    rng.permuted(interleaved, axis=1, out=interleaved)
+    return interleaved.reshape(-1)
 
 
 # a sequence whose variance gradually increases
 @datagen("i64")
 def dist_shift():
-    log_std = np.linspace(-1.5, 25, n)
-    return 0.5 + np.exp(log_std) * np.random.normal(size=n)
+    std = np.linspace(-1.5, 25, n)
+    np.exp(std, out=std)
+    res = rng.standard_normal(n)
+    res *= std
+    res += 0.5
+    return res
 
 
 # a diabolically hard sequence
@@ -290,24 +357,36 @@ def dist_shift():
 @datagen("f64")
 def diablo():
     n_subseqs = 77
-    subseq_vals = np.random.randint(1e4, 1e5, size=n_subseqs)
-    the_data = []
-    log_delta_scale = 0.0
+    subseq_vals = rng.integers(10_000, 100_000, size=n_subseqs)
     frequency = 1e-4
     add_scale = np.sqrt(np.exp(2 * frequency) - 1)
     mult = np.exp(-frequency)
-    while len(the_data) < n:
-        the_data.extend(subseq_vals[np.random.uniform(size=n_subseqs) > 0.9])
-        log_delta_scale += np.random.normal() * add_scale
-        log_delta_scale *= mult
-        delta_scale = 3 * np.exp(log_delta_scale)
-        subseq_vals += np.random.uniform(
-            -delta_scale, delta_scale, size=n_subseqs
-        ).astype(int)
-    the_data = np.array(the_data[:n]).astype(np.float64)
+    # each step keeps ~10% of the subsequences' values, so this many steps is
+    # plenty to produce n elements
+    n_steps = int(1.05 * n / (0.1 * n_subseqs)) + 10
+    keep = rng.uniform(size=(n_steps, n_subseqs)) > 0.9
+    # the log delta scale follows x_t = mult * (x_{t-1} + eps_t), which
+    # unrolls to x_t = mult^(t+1) * sum_{s<=t} mult^(-s) * eps_s
+    eps = rng.standard_normal(n_steps) * add_scale
+    mult_powers = mult ** np.arange(n_steps)
+    log_delta_scale = mult * mult_powers * np.cumsum(eps / mult_powers)
+    # step t's values only see the deltas drawn in earlier steps
+    step_scale = np.zeros(n_steps)
+    step_scale[1:] = 3 * np.exp(log_delta_scale[:-1])
+    # keep the integer random walk in float64 (exact well below 2^53) so the
+    # result is already the output dtype
+    deltas = rng.uniform(
+        -step_scale[:, None], step_scale[:, None], size=(n_steps, n_subseqs)
+    )
+    np.trunc(deltas, out=deltas)
+    np.cumsum(deltas, axis=0, out=deltas)
+    deltas += subseq_vals
+    the_data = deltas[keep]
+    assert len(the_data) >= n
+    the_data = the_data[:n]
     the_data /= 100.0
     machine_eps = 1.0e-52
-    the_data *= np.random.uniform(1 - 2 * machine_eps, 1 + 3 * machine_eps, size=n)
+    the_data *= rng.uniform(1 - 2 * machine_eps, 1 + 3 * machine_eps, size=n)
     return the_data
 
 
@@ -315,6 +394,50 @@ def uniquify_preserving_order(xs):
     return list(dict.fromkeys(xs))
 
 
+def positive_int(s):
+    value = int(s)
+    if value <= 0:
+        raise argparse.ArgumentTypeError(f"must be positive, but was {value}")
+    return value
+
+
+def _is_up_to_date(full_name, key, manifest, base_dir):
+    entry = manifest.get(full_name)
+    if entry is None or entry["key"] != key:
+        return False
+    bin_path = base_dir / "binary" / f"{full_name}.bin"
+    txt_path = base_dir / "txt" / f"{full_name}.txt"
+    if not bin_path.exists() or not txt_path.exists():
+        return False
+    if _sha256_file(bin_path) != entry["sha256"]:
+        return False
+    return _sha256_file(txt_path) == entry.get("txt_sha256")
+
+
+# returns manifest entries for whatever was (re)written
+def _gen_one(name, base_dir, manifest):
+    global rng
+    (f, dtypes) = DATA_GENS[name]
+    # numpy doesn't promise stable random streams across versions
+    key = f"n={n}:numpy={np.__version__}:source={source_hash}"
+    stale_dtypes = [
+        dtype
+        for dtype in dtypes
+        if not _is_up_to_date(get_full_name(dtype, name), key, manifest, base_dir)
+    ]
+    if not stale_dtypes:
+        print(f"skipping {name}; already up to date")
+        return {}
+
+    rng = _new_rng()
+    data = f()
+    written = {}
+    for dtype in stale_dtypes:
+        digests = write_dispatch(dtype, data, name, base_dir)
+        written[get_full_name(dtype, name)] = {"key": key, **digests}
+    return written
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument(
@@ -323,6 +446,17 @@ if __name__ == "__main__":
         default=Path("data"),
         help="Directory in which to write the output data",
     )
+    parser.add_argument(
+        "--workers",
+        type=positive_int,
+        default=os.cpu_count(),
+        help="Number of processes to generate datasets with",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Regenerate datasets even if their outputs are already up to date",
+    )
     parser.add_argument(
         "datasets",
         type=str,
@@ -346,9 +480,28 @@ if __name__ == "__main__":
             if name not in DATA_GENS:
                 raise NotImplementedError(f"Unrecognized dataset name: {name}")
 
-    for name in datasets:
-        (f, dtypes) = DATA_GENS[name]
-        np.random.seed(0)
-        data = f()
-        for dtype in dtypes:
-            write_dispatch(dtype, data, name, args.base_dir)
+    manifest_path = args.base_dir / ".manifest.json"
+    manifest = {}
+    if manifest_path.exists():
+        manifest = json.loads(manifest_path.read_text())
+
+    gen_one = partial(
+        _gen_one,
+        base_dir=args.base_dir,
+        manifest={} if args.force else manifest,
+    )
+    # datasets are independent and each one is reseeded, so we can generate
+    # them in separate processes without affecting the output
+    # keep a record of every dataset that finished, even if others failed
+    failed = []
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {executor.submit(gen_one, name): name for name in datasets}
+        for future in as_completed(futures):
+            if future.exception() is None:
+                manifest.update(future.result())
+            else:
+                print(f"failed to generate {futures[future]}: {future.exception()!r}")
+                failed.append(future)
+    manifest_path.write_text(json.dumps(manifest, indent=2, sort_keys=True))
+    if failed:
+        raise failed[0].exception()
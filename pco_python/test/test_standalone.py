@@ -40,10 +40,21 @@ all_float_quant_specs = (
 )
 
 
-@pytest.mark.parametrize("shape", all_shapes)
+# drawn once per shape and cast to each dtype
+@pytest.fixture(scope="module", params=all_shapes, ids=str)
+def base_data(request):
+    return np.random.uniform(0, 1000, size=request.param)
+
+
+@pytest.fixture(scope="module")
+def f32_compressed():
+    data = np.random.uniform(size=100).astype(np.float32)
+    return standalone.simple_compress(data, ChunkConfig())
+
+
 @pytest.mark.parametrize("dtype", all_dtypes)
-def test_round_trip_decompress_into(shape, dtype):
-    data = np.random.uniform(0, 1000, size=shape).astype(dtype)
+def test_round_trip_decompress_into(base_data, dtype):
+    data = base_data.astype(dtype)
     compressed = standalone.simple_compress(data, ChunkConfig())
 
     # decompress exactly
@@ -54,16 +65,15 @@ def test_round_trip_decompress_into(shape, dtype):
     assert progress.finished
 
 
-@pytest.mark.parametrize("shape", all_shapes)
 @pytest.mark.parametrize("dtype", all_dtypes)
-def test_round_trip_simple_decompress(shape, dtype):
-    data = np.random.uniform(0, 1000, size=shape).astype(dtype)
+def test_round_trip_simple_decompress(base_data, dtype):
+    data = base_data.astype(dtype)
     compressed = standalone.simple_compress(
         data, ChunkConfig(paging_spec=PagingSpec.equal_pages_up_to(300))
     )
     out = standalone.simple_decompress(compressed)
     # data are decompressed into a 1D array; ensure it can be reshaped to the original shape
-    out.shape = shape
+    out.shape = data.shape
     np.testing.assert_array_equal(data, out)
 
 
@@ -82,25 +92,22 @@ def test_inexact_decompression():
     out = np.zeros(600)
     progress = standalone.simple_decompress_into(compressed, out)
     np.testing.assert_array_equal(out[:300], data)
-    np.testing.assert_array_equal(out[300:], np.zeros(300))
+    assert not out[300:].any()
     assert progress.n_processed == 300
     assert progress.finished
 
 
-def test_simple_decompress_into_errors():
+def test_simple_decompress_into_errors(f32_compressed):
     """Test possible error states for standalone.simple_decompress_into"""
-    data = np.random.uniform(size=100).astype(np.float32)
-    compressed = standalone.simple_compress(data, ChunkConfig())
-
     out = np.zeros(100).astype(np.float64)
     with pytest.raises(RuntimeError, match="data type byte does not match"):
-        standalone.simple_decompress_into(compressed, out)
+        standalone.simple_decompress_into(f32_compressed, out)
 
 
-def test_simple_decompress_errors():
+def test_simple_decompress_errors(f32_compressed):
     """Test possible error states for standalone.simple_decompress"""
-    data = np.random.uniform(size=100).astype(np.float32)
-    compressed = bytearray(standalone.simple_compress(data, ChunkConfig()))
+    # copy, since we corrupt the bytes below
+    compressed = bytearray(f32_compressed)
 
     truncated = compressed[:8]
     with pytest.raises(RuntimeError, match="empty bytes"):